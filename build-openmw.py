@@ -1,9 +1,15 @@
 #!/usr/bin/env python3
 import argparse
+import concurrent.futures
 import datetime
+import functools
+import hashlib
 import logging
+import multiprocessing
 import os
 import shutil
+import stat
+import string
 import subprocess
 import sys
 
@@ -12,10 +18,18 @@ BULLET_VERSION = "3.17"
 FFMPEG_VERSION = "n4.4.1"
 MYGUI_VERSION = "MyGUI3.4.1"
 SDL2_VERSION = "release-2.0.14"
-QT_VERSION = "5.15.0"
+QT_VERSION = "v5.15.0"
 UNSHIELD_VERSION = "1.4.2"
 OPENMW_OSG_BRANCH = "3.6"
-CPUS = os.cpu_count() + 1
+OPENMW_GIT_URL = "https://github.com/OpenMW/openmw.git"
+# Dependencies that can be built at the same time as each other
+CONCURRENT_LIBS = ("osg-openmw", "bullet", "mygui", "unshield")
+CPUS = (os.cpu_count() or 1) + 1
+CCACHE = shutil.which("ccache") or shutil.which("sccache")
+NINJA = shutil.which("ninja")
+CCACHE_DIR = os.getenv(
+    "CCACHE_DIR", os.path.join(os.path.expanduser("~"), ".ccache-openmw")
+)
 INSTALL_PREFIX = os.path.join("/", "opt", "build-openmw")
 DESC = "Build OpenMW for your system, install it all to {}.  Also builds the OpenMW fork of OSG, and optionally libBullet, Unshield, and MyGUI, and links against those builds.".format(
     INSTALL_PREFIX
@@ -47,43 +61,145 @@ DEBIAN_PKGS += [
     "libboost-system-dev",
 ]
 VOID_PKGS = "make SDL2-devel boost-devel bullet-devel cmake ffmpeg-devel freetype-devel gcc git libXt-devel libavformat libavutil liblz4-devel libmygui-devel libopenal-devel libopenjpeg2-devel libswresample libswscale libunshield-devel pkg-config python-devel python3-devel qt5-devel sqlite-devel zlib-devel".split()
+# cmake options for the dependencies built here
+BULLET_CMAKE_ARGS = (
+    "-DINSTALL_LIBS=on",
+    "-DBUILD_BULLET3=off",
+    "-DBUILD_CPU_DEMOS=off",
+    "-DBUILD_UNIT_TESTS=off",
+    "-DBUILD_BULLET2_DEMOS=off",
+    "-DBUILD_EXTRAS=off",
+    "-DBUILD_GIMPACTUTILS_EXTRA=off",
+    "-DBUILD_HACD_EXTRA=off",
+    "-DBUILD_INVERSE_DYNAMIC_EXTRA=off",
+    "-DBUILD_OBJ2SDF_EXTRA=off",
+    "-DBUILD_OPENGL3_DEMOS=off",
+    "-DBUILD_BULLET_ROBOTICS_EXTRA=off",
+    "-DBUILD_BULLET_ROBOTICS_GUI_EXTRA=off",
+    "-DBUILD_SHARED_LIBS=on",
+    "-DBULLET2_MULTITHREADING=on",
+    "-DUSE_DOUBLE_PRECISION=on",
+    "-DCMAKE_BUILD_TYPE=Release",
+)
+MYGUI_CMAKE_ARGS = (
+    "-DMYGUI_BUILD_TOOLS=OFF",
+    "-DMYGUI_RENDERSYSTEM=1",
+    "-DMYGUI_BUILD_DEMOS=OFF",
+    "-DMYGUI_BUILD_PLUGINS=OFF",
+    "-DMYGUI_BUILD_TEST_APP=OFF",
+    "-DMYGUI_BUILD_UNITTESTS=OFF",
+)
+OSG_CMAKE_ARGS = (
+    "-DBUILD_OSG_PLUGINS_BY_DEFAULT=0",
+    "-DBUILD_OSG_PLUGIN_OSG=1",
+    "-DBUILD_OSG_PLUGIN_DDS=1",
+    "-DBUILD_OSG_PLUGIN_TGA=1",
+    "-DBUILD_OSG_PLUGIN_BMP=1",
+    "-DBUILD_OSG_PLUGIN_JPEG=1",
+    "-DBUILD_OSG_PLUGIN_PNG=1",
+    "-DBUILD_OSG_DEPRECATED_SERIALIZERS=0",
+    "-DBUILD_OSG_EXAMPLES=0",
+)
+# Switches that only need announcing, in the order they're announced
+FLAG_MESSAGES = (
+    ("force_all", "Force building all dependencies"),
+    ("system_bullet", "Using the system LibBullet"),
+    ("build_ffmpeg", "Building FFMPEG"),
+    ("build_mygui", "Building MyGUI"),
+    ("build_qt5", "Building Qt"),
+    ("build_sdl2", "Building SDL2"),
+    ("build_unshield", "Building Unshield"),
+    ("force_bullet", "Forcing build of LibBullet"),
+    ("force_ffmpeg", "Forcing build of FFMPEG"),
+    ("force_mygui", "Forcing build of MyGUI"),
+    ("force_qt5", "Forcing build of Qt"),
+    ("force_sdl2", "Forcing build of SDL2"),
+    ("force_openmw", "Forcing build of OpenMW"),
+    ("force_osg", "Forcing build of OSG"),
+    ("force_unshield", "Forcing build of Unshield"),
+    ("no_pull", "git fetch will not be ran"),
+    ("skip_install_pkgs", "Package installs will be skipped"),
+    ("system_osg", "The system OSG will be used."),
+    ("verbose", "Verbose output enabled"),
+)
+# What --force-all turns on
+FORCE_ALL_FLAGS = (
+    "force_bullet",
+    "force_ffmpeg",
+    "force_mygui",
+    "force_openmw",
+    "force_osg",
+    "force_qt5",
+    "force_unshield",
+)
 PROG = "build-openmw"
 VERSION = "1.13"
 
 
-def emit_log(msg: str, level=logging.INFO, quiet=False, *args, **kwargs) -> None:
-    """Logging wrapper."""
+def emit_log(msg: str, *args, level=logging.INFO, quiet=False, **kwargs) -> None:
+    """
+    Logging wrapper.  Pass values as %-style args rather than formatting
+    them into msg, so logging only builds the string if it's emitted.
+    """
     if not quiet:
-        if level == logging.DEBUG:
-            logging.debug(msg, *args, **kwargs)
-        elif level == logging.INFO:
-            logging.info(msg, *args, **kwargs)
-        elif level == logging.WARN:
-            logging.warning(msg, *args, **kwargs)
-        elif level == logging.ERROR:
-            logging.error(msg, *args, **kwargs)
+        logging.log(level, msg, *args, **kwargs)
 
 
 def ensure_dir(path: str, create=True):
     """
-    Small directory-making wrapper, uses sudo to create
-    if need be and then chowns to the running user.
+    Small directory-making wrapper, creates any missing parents too.  Only
+    falls back to sudo if need be and then chowns to the running user.
     """
-    if not os.path.exists(path) and not os.path.isdir(path):
+    if stat_type(path) is None:
         if create:
             try:
-                os.mkdir(path)
+                os.makedirs(path, exist_ok=True)
             except PermissionError:
-                emit_log("Can't write '{}', trying with sudo...".format(path))
-                execute_shell(["sudo", "mkdir", path])[1]
-                emit_log("Chowning '{}' so sudo isn't needed anymore...".format(path))
+                emit_log("Can't write '%s', trying with sudo...", path)
+                execute_shell(["sudo", "mkdir", "-p", path])[1]
+                emit_log("Chowning '%s' so sudo isn't needed anymore...", path)
                 execute_shell(["sudo", "chown", "{}:".format(os.getlogin()), path])[1]
-            emit_log("{} now exists".format(path))
+            emit_log("%s now exists", path)
         else:
-            emit_log("Does {0} exist? {1}".format(path, os.path.isdir(path)))
-            return os.path.isdir(path)
+            emit_log("Does %s exist? %s", path, False)
+            return False
     else:
-        emit_log("{} exists".format(path))
+        emit_log("%s exists", path)
+
+
+def stat_type(path: str):
+    """
+    Return the file type bits of path (compare against stat.S_IFREG,
+    stat.S_IFDIR, ...) or None if it doesn't exist, with a single stat call.
+    """
+    try:
+        return stat.S_IFMT(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return None
+
+
+def is_built(check_file: str, src: str, cmake=True, patch=None) -> bool:
+    """
+    Is check_file there and newer than the CMakeLists.txt (or configure
+    script) in src and the patch, if any?  check_file's ctime is used since
+    an install can carry the mtime of whatever it copied over.
+    """
+    try:
+        st = os.stat(check_file)
+    except FileNotFoundError:
+        return False
+    if not stat.S_ISREG(st.st_mode):
+        return False
+    inputs = [os.path.join(src, "CMakeLists.txt" if cmake else "configure")]
+    if patch:
+        inputs.append(patch)
+    for path in inputs:
+        try:
+            if os.stat(path).st_mtime > st.st_ctime:
+                return False
+        except FileNotFoundError:
+            pass
+    return True
 
 
 def error_and_die(msg: str) -> SystemExit:
@@ -91,18 +207,144 @@ def error_and_die(msg: str) -> SystemExit:
     sys.exit(1)
 
 
-def execute_shell(cli_args: list, env=None, verbose=False) -> tuple:
-    """Small convenience wrapper around subprocess.Popen."""
+def execute_shell(
+    cli_args: list, cwd=None, env=None, verbose=False, discard_stdout=False
+) -> tuple:
+    """
+    Small convenience wrapper around subprocess.run.  With discard_stdout
+    the child's stdout goes straight to /dev/null instead of being buffered
+    in memory, which matters for chatty commands like make.
+
+    The command is started by its full path and with close_fds off (our own
+    fds are non-inheritable anyway), which lets subprocess use posix_spawn
+    rather than forking this whole interpreter for every git/cmake/make.
+    A cwd rules that out, so prefer the command's own -C where it has one.
+    """
     # TODO: Some way to show the build env when printing the command
-    emit_log("EXECUTING: " + " ".join(cli_args), level=logging.DEBUG)
+    emit_log("EXECUTING: %s", " ".join(cli_args), level=logging.DEBUG)
+    exe = shutil.which(cli_args[0], path=(env or os.environ).get("PATH"))
     if verbose:
-        p = subprocess.Popen(cli_args, env=env)
+        p = subprocess.run(cli_args, executable=exe, close_fds=False, cwd=cwd, env=env)
     else:
-        p = subprocess.Popen(
-            cli_args, stderr=subprocess.PIPE, stdout=subprocess.PIPE, env=env
+        p = subprocess.run(
+            cli_args,
+            executable=exe,
+            close_fds=False,
+            cwd=cwd,
+            stderr=subprocess.PIPE,
+            stdout=subprocess.DEVNULL if discard_stdout else subprocess.PIPE,
+            env=env,
         )
-    c = p.communicate()
-    return p.returncode, c
+    return p.returncode, (p.stdout, p.stderr)
+
+
+def compiler_env(launcher: str, env=None, distcc=None) -> dict:
+    """
+    Return a copy of env (or of os.environ) with ccache pointed at a cache
+    that is shared by every build this script does, handing compiles off to
+    distcc/icecc when one is given.
+    """
+    env = dict(os.environ if env is None else env)
+    if os.path.basename(launcher) == "ccache":
+        env["CCACHE_DIR"] = CCACHE_DIR
+        env["CCACHE_MAXSIZE"] = os.getenv("CCACHE_MAXSIZE", "20G")
+        # Hash the compiler itself rather than trusting its mtime, so the
+        # cache survives reinstalling the same compiler (e.g. a fresh
+        # container) instead of missing on everything.
+        env["CCACHE_COMPILERCHECK"] = os.getenv("CCACHE_COMPILERCHECK", "content")
+        if distcc:
+            env["CCACHE_PREFIX"] = distcc
+    if distcc:
+        # distcc reads its host list from one of these.
+        for var in ("DISTCC_HOSTS", "HOME"):
+            if var in os.environ:
+                env.setdefault(var, os.environ[var])
+    return env
+
+
+def is_sha(rev: str) -> bool:
+    """Does rev look like a (possibly abbreviated) commit sha?"""
+    return 7 <= len(rev) <= 40 and all(c in string.hexdigits for c in rev)
+
+
+def git_fetch(repo_dir: str, rev: str, verbose=False) -> None:
+    """
+    Fetch only rev from its remote instead of doing a 'git fetch --all',
+    keeping shallow clones shallow.  Falls back to fetching every branch and
+    tag of the remote when rev can't be fetched on its own (e.g. an
+    abbreviated sha.)
+    """
+    remote, sep, name = rev.partition("/")
+    if sep:
+        refspec = "+refs/heads/{0}:refs/remotes/{1}/{0}".format(name, remote)
+    elif len(rev) == 40 and is_sha(rev):
+        remote, refspec = "origin", rev
+    else:
+        remote, refspec = "origin", "+refs/tags/{0}:refs/tags/{0}".format(rev)
+
+    shallow = os.path.exists(os.path.join(repo_dir, ".git", "shallow"))
+    cmd = ["git", "-C", repo_dir, "fetch"]
+    if shallow:
+        cmd += ["--depth", "1"]
+    if execute_shell(cmd + [remote, refspec], verbose=verbose)[0] != 0:
+        emit_log("Couldn't fetch %s on its own, fetching everything ...", rev)
+        cmd = ["git", "-C", repo_dir, "fetch"]
+        if shallow:
+            cmd.append("--unshallow")
+        # Spelled out since a --single-branch clone's own refspec only
+        # covers the branch it was cloned from.
+        cmd += [
+            remote,
+            "+refs/heads/*:refs/remotes/{}/*".format(remote),
+            "+refs/tags/*:refs/tags/*",
+        ]
+        execute_shell(cmd, verbose=verbose)
+
+
+def clone_if_missing(
+    libname, clone_dest, git_url, version="master", src_dir=SRC_DIR
+) -> None:
+    """
+    Clone git_url into src_dir/clone_dest unless it's already there.  This
+    doesn't chdir or touch any shared state, so several clones can safely
+    run side by side in worker threads.
+    """
+    if os.path.exists(os.path.join(src_dir, clone_dest)):
+        return
+    emit_log("%s source directory not found, cloning...", clone_dest)
+    if "osg-openmw" in clone_dest:
+        version = OPENMW_OSG_BRANCH
+    # Submodules are fetched in parallel rather than one after the other.
+    cmd = [
+        "git",
+        "-C",
+        src_dir,
+        "-c",
+        "submodule.fetchJobs={}".format(CPUS),
+        "clone",
+        "--jobs={}".format(CPUS),
+        "--recurse-submodules",
+    ]
+    remote, sep, name = version.partition("/")
+    if (sep and remote != "origin") or is_sha(version):
+        # A shallow clone can only start from a branch or tag of origin, so
+        # keep every commit around for the checkout but fetch blobs lazily.
+        cmd += ["--filter=blob:none"]
+    else:
+        cmd += [
+            "--depth",
+            "1",
+            "--single-branch",
+            "--shallow-submodules",
+            "-b",
+            name if sep else version,
+        ]
+    cmd += [git_url, clone_dest]
+    code, (out, err) = execute_shell(cmd)
+    if code != 0 or not os.path.exists(os.path.join(src_dir, clone_dest)):
+        emit_log(err.decode("utf-8"))
+        error_and_die("Could not clone {} for some reason!".format(libname))
+    emit_log("%s cloned", clone_dest)
 
 
 def build_library(
@@ -112,8 +354,11 @@ def build_library(
     cmake=True,
     cmake_args=None,
     cmake_target="..",
+    compiler_launcher=CCACHE,
     cpus=None,
+    distcc=None,
     env=None,
+    fetch=True,
     force=False,
     install_prefix=INSTALL_PREFIX,
     git_url=None,
@@ -125,18 +370,18 @@ def build_library(
     version="master",
 ):
     def _configure_make():
-        emit_log("{} building with configure and make!".format(libname))
+        emit_log("%s building with configure and make!", libname)
 
-        emit_log("{} running make clean ...".format(libname))
-        out, err = execute_shell(["make", "clean"], verbose=verbose)[1]
+        emit_log("%s running make clean ...", libname)
+        out, err = execute_shell(["make", "-C", src, "clean"], verbose=verbose)[1]
         # if err:
         #     error_and_die(err.decode("utf-8"))
 
-        emit_log("{} running configure ...".format(libname))
+        emit_log("%s running configure ...", libname)
         if libname == "qt5":
             c = [
                 "./configure",
-                "--prefix={0}/{1}".format(install_prefix, libname),
+                "--prefix=" + prefix,
                 "-opensource",
                 "-confirm-license",
                 "-qt-harfbuzz",
@@ -148,158 +393,334 @@ def build_library(
                 "-shared",
             ]
         else:
-            c = ["./configure", "--prefix={0}/{1}".format(install_prefix, libname)]
+            c = ["./configure", "--prefix=" + prefix]
+
+        cc_env = env
+        if compiler_launcher:
+            # configure scripts have no launcher setting, so the launcher goes
+            # in front of the compiler itself.
+            cc_env = dict(
+                env,
+                CC="{} {}".format(compiler_launcher, env.get("CC", "cc")),
+                CXX="{} {}".format(compiler_launcher, env.get("CXX", "c++")),
+            )
+            if libname == "ffmpeg":
+                # FFmpeg ignores CC/CXX from the environment.
+                c += ["--cc=" + cc_env["CC"], "--cxx=" + cc_env["CXX"]]
+            elif libname == "qt5" and os.path.basename(compiler_launcher) == "ccache":
+                c.append("-ccache")
 
         # ./configure -prefix /usr/local -headerdir /usr/local/include/qt5 -opensource -confirm-license -qt-harfbuzz -fontconfig -no-use-gold-linker -no-mimetype-database -nomake examples -shared > ${deps_dir}/qt5.log 2>&1
 
-        out, err = execute_shell(c, verbose=verbose)[1]
+        out, err = execute_shell(c, cwd=src, env=cc_env, verbose=verbose)[1]
         if err:
             error_and_die(err.decode("utf-8"))
 
-        emit_log("{} running make (this will take a while) ...".format(libname))
-        exitcode, output = execute_shell(["make", "-j{}".format(cpus)], verbose=verbose)
+        emit_log("%s running make (this will take a while) ...", libname)
+        exitcode, output = execute_shell(
+            ["make", "-C", src, "-j{}".format(cpus)],
+            env=cc_env,
+            verbose=verbose,
+            discard_stdout=True,
+        )
         if exitcode != 0:
             emit_log(output[1])
             error_and_die("make exited nonzero!")
 
-        emit_log("{} running make install ...".format(libname))
-        out, err = execute_shell(["make", "install"], verbose=verbose)[1]
+        emit_log("%s running make install ...", libname)
+        out, err = execute_shell(
+            ["make", "-C", src, "install"], env=cc_env, verbose=verbose
+        )[1]
         if err:
             error_and_die(err.decode("utf-8"))
 
-        emit_log("{} installed successfully!".format(libname))
+        emit_log("%s installed successfully!", libname)
 
     def _git_clean_src():
-        os.chdir(os.path.join(src_dir, clone_dest))
-        if force:
+        if libname == "osg-openmw":
+            rev = "origin/" + OPENMW_OSG_BRANCH
+        else:
+            rev = version
+        if force and fetch:
             # TODO: also do this if an explicit fetch flag is used
             emit_log("Fetching latest sources ...")
-            execute_shell(["git", "fetch", "--all"])[1][0]
-        emit_log("{} executing source clean".format(libname))
-        execute_shell(["git", "checkout", "--", "."], verbose=verbose)
-        execute_shell(["git", "clean", "-df"], verbose=verbose)
-
-        if libname == "osg-openmw":
-            emit_log(
-                "{} resetting source to the desired rev ({rev})".format(
-                    libname, rev=OPENMW_OSG_BRANCH
-                )
-            )
-            execute_shell(["git", "checkout", OPENMW_OSG_BRANCH], verbose=verbose)
-            execute_shell(
-                ["git", "reset", "--hard", "origin/" + OPENMW_OSG_BRANCH],
-                verbose=verbose,
-            )
-
-        elif libname != "osg-openmw":
-            emit_log(
-                "{} resetting source to the desired rev ({rev})".format(
-                    libname, rev=version
-                )
-            )
-            execute_shell(["git", "checkout", version], verbose=verbose)
-            execute_shell(["git", "reset", "--hard", version], verbose=verbose)
+            git_fetch(src, rev, verbose=verbose)
+
+        emit_log("%s resetting source to the desired rev (%s)", libname, rev)
+        # One checkout both throws away local changes and moves to rev.
+        exitcode, output = execute_shell(
+            [
+                "git",
+                "-C",
+                src,
+                "-c",
+                "advice.detachedHead=false",
+                "checkout",
+                "--force",
+                "--detach",
+                rev,
+            ],
+            verbose=verbose,
+        )
+        if exitcode != 0:
+            if output[1]:
+                emit_log(output[1].decode("utf-8"))
+            error_and_die("Could not check out {} for {}!".format(rev, libname))
+        # The checkout leaves untracked files (e.g. ones a patch added) behind.
+        emit_log("%s executing source clean", libname)
+        # The build dir is kept for incremental rebuilds.
+        execute_shell(
+            ["git", "-C", src, "clean", "-df", "--exclude=/build"], verbose=verbose
+        )
 
     if not clone_dest:
         clone_dest = libname
-    if os.path.exists(check_file) and os.path.isfile(check_file) and not force:
-        emit_log("{} found!".format(libname))
+    src = os.path.join(src_dir, clone_dest)
+    prefix = os.path.join(install_prefix, libname)
+    if not force and is_built(check_file, src, cmake, patch):
+        emit_log("%s found!", libname)
     else:
-        emit_log("{} building now ...".format(libname))
-        if not os.path.exists(os.path.join(src_dir, clone_dest)):
-            emit_log("{} source directory not found, cloning...".format(clone_dest))
-            os.chdir(src_dir)
-            if "osg-openmw" in clone_dest:
-                execute_shell(
-                    ["git", "clone", "-b", OPENMW_OSG_BRANCH, git_url, clone_dest],
-                    verbose=verbose,
-                )[1]
-            else:
-                execute_shell(["git", "clone", git_url, clone_dest], verbose=verbose)[1]
-            if not os.path.exists(os.path.join(src_dir, libname)):
-                error_and_die("Could not clone {} for some reason!".format(clone_dest))
+        emit_log("%s building now ...", libname)
+        clone_if_missing(libname, clone_dest, git_url, version, src_dir=src_dir)
 
-        if force and os.path.exists(os.path.join(install_prefix, libname)):
-            emit_log("{} forcing removal of previous install".format(libname))
-            shutil.rmtree(os.path.join(install_prefix, libname))
+        if force and os.path.exists(prefix):
+            emit_log("%s forcing removal of previous install", libname)
+            shutil.rmtree(prefix)
 
         _git_clean_src()
 
         if patch:
-            emit_log("Applying patch: " + patch)
-            code = os.system("patch -p1 < " + patch)
+            emit_log("Applying patch: %s", patch)
+            code, (out, err) = execute_shell(
+                ["patch", "-d", src, "-p1", "-i", patch], verbose=verbose
+            )
             if code > 0:
+                if err:
+                    emit_log(err.decode("utf-8"))
                 error_and_die("There was a problem applying the patch!")
 
-        os.chdir(os.path.join(src_dir, clone_dest))
+        if compiler_launcher:
+            emit_log(
+                "%s compiling through %s",
+                libname,
+                os.path.basename(compiler_launcher),
+            )
+            env = compiler_env(compiler_launcher, env, distcc)
 
         if cmake:
-            emit_log("{} building with cmake".format(libname))
-            build_dir = os.path.join(src_dir, clone_dest, "build")
-            if os.path.isdir(build_dir):
-                emit_log("Removing dir tree: " + build_dir)
-                shutil.rmtree(build_dir)
-            os.mkdir(build_dir)
-            os.chdir(build_dir)
-
-            emit_log("{} running cmake ...".format(libname))
+            emit_log("%s building with cmake", libname)
             build_cmd = [
                 "cmake",
-                "-DCMAKE_INSTALL_PREFIX={}/{}".format(install_prefix, libname),
+                "-DCMAKE_INSTALL_PREFIX=" + prefix,
             ]
+            if compiler_launcher:
+                build_cmd += [
+                    "-DCMAKE_C_COMPILER_LAUNCHER=" + compiler_launcher,
+                    "-DCMAKE_CXX_COMPILER_LAUNCHER=" + compiler_launcher,
+                ]
+            if NINJA:
+                build_cmd += ["-G", "Ninja"]
+                make = "ninja"
+            else:
+                make = "make"
             if cmake_args:
                 build_cmd += cmake_args
             build_cmd += [cmake_target]
-            exitcode, output = execute_shell(build_cmd, env=env, verbose=verbose)
+
+            # Keep the previous build around so only what changed gets
+            # recompiled.  cmake picks up new option values by itself, but it
+            # can't switch generators or compilers in an existing build dir,
+            # and it keeps options that are no longer passed in its cache as
+            # well as what it found via CMAKE_PREFIX_PATH, so start over
+            # whenever any of those change.
+            build_dir = os.path.join(src, "build")
+            hash_file = os.path.join(build_dir, ".build-openmw-cmakehash")
+            cmake_env = os.environ if env is None else env
+            cmake_hash = hashlib.sha1(
+                "\0".join(
+                    [
+                        arg
+                        for arg in build_cmd
+                        if not arg.startswith("-DCMAKE_INSTALL_PREFIX=")
+                    ]
+                    + [
+                        cmake_env.get("CC", ""),
+                        cmake_env.get("CXX", ""),
+                        cmake_env.get("CMAKE_PREFIX_PATH", ""),
+                    ]
+                ).encode("utf-8")
+            ).hexdigest()
+            if stat_type(build_dir) == stat.S_IFDIR:
+                old_hash = None
+                if stat_type(hash_file) == stat.S_IFREG:
+                    with open(hash_file) as f:
+                        old_hash = f.read().strip()
+                if old_hash != cmake_hash:
+                    emit_log("Removing dir tree: %s", build_dir)
+                    shutil.rmtree(build_dir)
+            os.makedirs(build_dir, exist_ok=True)
+
+            emit_log("%s running cmake ...", libname)
+            # cmake_target is relative to the build dir.
+            exitcode, output = execute_shell(
+                build_cmd, cwd=build_dir, env=env, verbose=verbose
+            )
             if exitcode != 0:
                 emit_log(output[1])
                 error_and_die("cmake exited nonzero!")
+            with open(hash_file, "w") as f:
+                f.write(cmake_hash + "\n")
 
-            emit_log("{} running make (this will take a while) ...".format(libname))
+            emit_log("%s running %s (this will take a while) ...", libname, make)
+            # ninja reports compiler errors on stdout, so that has to be kept.
+            # '--build -j' needs cmake 3.12, so -j goes to make/ninja directly.
             exitcode, output = execute_shell(
-                ["make", "-j{}".format(cpus)], env=env, verbose=verbose
+                ["cmake", "--build", build_dir, "--", "-j", str(cpus)],
+                env=env,
+                verbose=verbose,
+                discard_stdout=not NINJA,
             )
             if exitcode != 0:
-                emit_log(output[1])
-                error_and_die("make exited nonzero!")
+                emit_log(output[0] if NINJA else output[1])
+                error_and_die("{} exited nonzero!".format(make))
 
             if make_install:
-                emit_log("{} running make install ...".format(libname))
-                out, err = execute_shell(["make", "install"], env=env, verbose=verbose)[
-                    1
-                ]
+                emit_log("%s running %s install ...", libname, make)
+                # 'cmake --install' is newer than the cmake on Debian 10.
+                exitcode, (out, err) = execute_shell(
+                    ["cmake", "--build", build_dir, "--target", "install"],
+                    env=env,
+                    verbose=verbose,
+                )
                 if err:
                     error_and_die(err.decode("utf-8"))
+                if exitcode != 0:
+                    emit_log(out)
+                    error_and_die("{} install exited nonzero!".format(make))
 
-                emit_log("{} installed successfully".format(libname))
+                emit_log("%s installed successfully", libname)
         else:
             _configure_make()
 
 
-def get_distro() -> tuple:
-    """Try to run 'lsb_release -d' and return the output."""
-    return execute_shell(["lsb_release", "-d"])[1]
+def build_many(specs: list) -> None:
+    """
+    Run build_library for each of specs (dicts of its keyword arguments) at
+    the same time, splitting the cpus between them.  Each build gets its own
+    process so its log lines can be tagged without affecting the others.  If
+    one fails, that's reported once the builds still running have finished.
+    Workers are always spawned, so they start the same way whatever the
+    interpreter's default start method is.
+    """
+    if len(specs) < 2:
+        for spec in specs:
+            build_library(**spec)
+        return
+    emit_log(
+        "Building %s at the same time ...",
+        ", ".join(spec["libname"] for spec in specs),
+    )
+    level = logging.getLogger().getEffectiveLevel()
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=len(specs), mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        futures = [
+            executor.submit(
+                build_in_worker,
+                dict(spec, cpus=max(1, int(spec["cpus"]) // len(specs))),
+                level,
+            )
+            for spec in specs
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
+
+
+def build_in_worker(spec: dict, level=logging.INFO) -> None:
+    """
+    build_library for a build_many worker process, logging at the parent's
+    level and tagging every log line with the library's name so the
+    interleaved output stays readable.
+    """
+    formatter = logging.Formatter(
+        LOGFMT.replace("%(message)s", spec["libname"] + " | %(message)s")
+    )
+    root = logging.getLogger()
+    if not root.handlers:
+        # Only forked workers inherit main's logging setup, spawn and
+        # forkserver ones (the default from Python 3.14) start bare.
+        logging.basicConfig(stream=sys.stdout)
+    root.setLevel(level)
+    for handler in root.handlers:
+        handler.setFormatter(formatter)
+    build_library(**spec)
+
+
+def needs_build(spec: dict) -> bool:
+    """Will build_library actually build with these keyword arguments?"""
+    src = os.path.join(
+        spec.get("src_dir", SRC_DIR), spec.get("clone_dest") or spec["libname"]
+    )
+    return spec.get("force", False) or not is_built(
+        spec["check_file"], src, spec.get("cmake", True), spec.get("patch")
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def get_distro() -> str:
+    """
+    Return the distro's name, read from /etc/os-release when there is one
+    and from 'lsb_release -d' otherwise.  Only looked up once per run.
+    """
+    try:
+        with open(os.path.join("/", "etc", "os-release")) as f:
+            release = dict(line.rstrip("\n").split("=", 1) for line in f if "=" in line)
+    except FileNotFoundError:
+        out, err = execute_shell(["lsb_release", "-d"])[1]
+        if err:
+            error_and_die(err.decode())
+        return out.decode().split(":")[1].strip()
+    return (release.get("PRETTY_NAME") or release.get("NAME", "")).strip("\"'")
 
 
 def get_repo_sha(
     src_dir: str, repo="openmw", rev=None, pull=True, verbose=False
 ) -> str:
-    try:
-        os.chdir(os.path.join(src_dir, repo))
-    except FileNotFoundError:
-        return False
+    """
+    Check out rev in src_dir/repo, fetching just that rev first if pull is
+    set, and return its short sha.
+    """
+    repo_dir = os.path.join(src_dir, repo)
+    if stat_type(repo_dir) != stat.S_IFDIR:
+        return ""
     if pull:
         emit_log("Fetching latest sources ...")
-        execute_shell(["git", "fetch", "--all"])[1][0]
-
-    execute_shell(["git", "checkout", rev], verbose=verbose)[1][0]
-    execute_shell(["git", "reset", "--hard", rev], verbose=verbose)[1][0]
+        git_fetch(repo_dir, rev, verbose=verbose)
+
+    exitcode, output = execute_shell(
+        [
+            "git",
+            "-C",
+            repo_dir,
+            "-c",
+            "advice.detachedHead=false",
+            "checkout",
+            "--force",
+            "--detach",
+            rev,
+        ],
+        verbose=verbose,
+    )
+    if exitcode != 0:
+        if output[1]:
+            emit_log(output[1].decode("utf-8"))
+        error_and_die("Could not check out {} for {}!".format(rev, repo))
 
-    out = execute_shell(["git", "rev-parse", "--short", "HEAD"])[1][0]
+    out = execute_shell(["git", "-C", repo_dir, "rev-parse", "--short", "HEAD"])[1][0]
     return out.decode().strip()
 
 
-def install_packages(distro: str, **kwargs) -> bool:
+def install_packages(distro: str, **kwargs) -> tuple:
     quiet = kwargs.pop("quiet", "")
     verbose = kwargs.pop("verbose", "")
 
@@ -308,65 +729,60 @@ def install_packages(distro: str, **kwargs) -> bool:
         quiet=quiet,
     )
     user_uid = os.getuid()
+    apt_get = [
+        "env",
+        "DEBIAN_FRONTEND=noninteractive",
+        "apt-get",
+        "install",
+        "-y",
+        "--force-yes",
+        "--no-install-recommends",
+    ]
     # TODO: install system OSG as needed..
     if "void" in distro.lower():
         emit_log("Distro detected as 'Void Linux'")
-        cmd = ["xbps-install", "--yes"] + VOID_PKGS
-        if user_uid > 0:
-            cmd = ["sudo"] + cmd
-        out, err = execute_shell(cmd, verbose=verbose)[1]
+        cmd = ["xbps-install", "--sync", "--yes"]
+        pkgs = VOID_PKGS
     elif "arch" in distro.lower():
         emit_log("Distro detected as 'Arch Linux'")
-        cmd = ["pacman", "-sy"] + ARCH_PKGS
-        if user_uid > 0:
-            cmd = ["sudo"] + cmd
-        out, err = execute_shell(cmd, verbose=verbose)[1]
+        cmd = ["pacman", "-sy"]
+        pkgs = ARCH_PKGS
     elif "debian" in distro.lower():
         emit_log("Distro detected as 'Debian'")
-        if user_uid > 0:
-            cmd = ["sudo", "apt-get", "install", "-y", "--force-yes"] + DEBIAN_PKGS
-        else:
-            cmd = ["apt-get", "install", "-y", "--force-yes"] + DEBIAN_PKGS
-        out, err = execute_shell(cmd, verbose=verbose)[1]
+        cmd = apt_get
+        pkgs = DEBIAN_PKGS
     elif "devuan" in distro.lower():
         emit_log("Distro detected as 'Devuan'")
         # Debian packages should just work in this case.
-        if user_uid > 0:
-            cmd = ["sudo", "apt-get", "install", "-y", "--force-yes"] + DEBIAN_PKGS
-        else:
-            cmd = ["apt-get", "install", "-y", "--force-yes"] + DEBIAN_PKGS
-        out, err = execute_shell(cmd, verbose=verbose)[1]
+        cmd = apt_get
+        pkgs = DEBIAN_PKGS
     elif "ubuntu" in distro.lower() or "mint" in distro.lower():
         emit_log("Distro detected as 'Mint' or 'Ubuntu'!")
-        msg = "Package installation completed!"
-        if user_uid > 0:
-            cmd = ["sudo", "apt-get", "install", "-y", "--force-yes"] + UBUNTU_PKGS
-        else:
-            cmd = ["apt-get", "install", "-y", "--force-yes"] + UBUNTU_PKGS
-        out, err = execute_shell(cmd, verbose=verbose)[1]
+        cmd = apt_get
+        pkgs = UBUNTU_PKGS
     elif "fedora" in distro.lower():
         emit_log("Distro detected as 'Fedora'")
-        if user_uid > 0:
-            # cmd = ["dnf", "groupinstall", "-y", "development-tools"]
-            # out, err = execute_shell(cmd, verbose=verbose)[1]
-            cmd = ["dnf", "install", "-y"] + FEDORA_PKGS
-            out, err = execute_shell(cmd, verbose=verbose)[1]
-        else:
-            # cmd = ["sudo", "dnf", "groupinstall", "-y", "development-tools"]
-            # out, err = execute_shell(cmd, verbose=verbose)[1]
-            cmd = ["sudo", "dnf", "install", "-y"] + FEDORA_PKGS
-            out, err = execute_shell(cmd, verbose=verbose)[1]
+        # cmd = ["dnf", "groupinstall", "-y", "development-tools"]
+        cmd = ["dnf", "install", "-y"]
+        pkgs = FEDORA_PKGS
     else:
         error_and_die(
             "Your OS is not yet supported!  If you think you know what you are doing, you can use '-S' to continue anyways."
         )
+
+    # Everything goes to the package manager in one go, minus the duplicates
+    # the package lists pick up from each other.
+    cmd = cmd + sorted(set(pkgs))
+    if user_uid > 0:
+        cmd = ["sudo"] + cmd
+    out, err = execute_shell(cmd, verbose=verbose)[1]
     msg = "Package installation completed"
 
     emit_log(msg)
     return out, err
 
 
-def parse_argv() -> None:
+def parse_argv() -> argparse.Namespace:
     """Set up args and parse them."""
     parser = argparse.ArgumentParser(description=DESC, prog=PROG)
     parser.add_argument(
@@ -448,6 +864,17 @@ def parse_argv() -> None:
     #     help="Specify the OpenMW OSG fork branch to build.  Default: "
     #     + OPENMW_OSG_BRANCH,
     # )
+    distributed_options = options.add_mutually_exclusive_group()
+    distributed_options.add_argument(
+        "--distcc",
+        action="store_true",
+        help="Distribute compilation with distcc, hosts are taken from DISTCC_HOSTS or ~/.distcc/hosts.",
+    )
+    distributed_options.add_argument(
+        "--icecream",
+        action="store_true",
+        help="Distribute compilation with icecream (icecc).",
+    )
     options.add_argument(
         "--install-prefix",
         help="Set the install prefix. Default: {}".format(INSTALL_PREFIX),
@@ -495,6 +922,11 @@ def parse_argv() -> None:
         action="store_true",
         help="Do build the ess importer. (Default: false)",
     )
+    options.add_argument(
+        "--without-ccache",
+        action="store_true",
+        help="Do not compile through ccache or sccache, even if installed. (Default: false)",
+    )
     options.add_argument(
         "--without-cs",
         action="store_true",
@@ -527,408 +959,353 @@ def main() -> None:
     logging.basicConfig(format=LOGFMT, level=logging.INFO, stream=sys.stdout)
     start = datetime.datetime.now()
     cpus = CPUS
-    distro = None
-    system_bullet = False
-    build_ffmpeg = False
-    build_mygui = False
-    build_sdl2 = False
-    build_qt5 = False
-    build_unshield = False
-    force_bullet = False
-    force_ffmpeg = False
-    force_mygui = False
-    force_sdl2 = False
-    force_qt5 = False
-    force_openmw = False
-    force_osg = False
-    force_unshield = False
+    distcc = None
+    distro = ""
     install_prefix = INSTALL_PREFIX
-    system_osg = False
     parsed = parse_argv()
     out_dir = OUT_DIR
     patch = None
-    pull = True
-    skip_install_pkgs = False
+    pull = not parsed.no_pull
     src_dir = SRC_DIR
-    verbose = False
     sha = None
     tag = None
     branch = "master"
-    with_debug = False
-    with_essimporter = False
-    without_cs = False
-    without_iniimporter = False
-    without_launcher = False
-    without_wizard = False
+    compiler_launcher = CCACHE
 
     sdl_version = SDL2_VERSION
 
+    if parsed.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+    for flag, msg in FLAG_MESSAGES:
+        if getattr(parsed, flag):
+            emit_log(msg)
     if parsed.force_all:
-        force_bullet = True
-        force_ffmpeg = True
-        force_mygui = True
-        force_openmw = True
-        force_osg = True
-        force_qt5 = True
-        force_unshield = True
-        emit_log("Force building all dependencies")
-    if parsed.system_bullet:
-        system_bullet = True
-        emit_log("Using the system LibBullet")
-    if parsed.build_ffmpeg:
-        build_ffmpeg = True
-        emit_log("Building FFMPEG")
-    if parsed.build_mygui:
-        build_mygui = True
-        emit_log("Building MyGUI")
-    if parsed.build_qt5:
-        build_qt5 = True
-        emit_log("Building Qt")
-    if parsed.build_sdl2:
-        build_sdl2 = True
-        emit_log("Building SDL2")
-    if parsed.build_unshield:
-        build_unshield = True
-        emit_log("Building Unshield")
-    if parsed.force_bullet:
-        force_bullet = True
-        emit_log("Forcing build of LibBullet")
-    if parsed.force_ffmpeg:
-        force_ffmpeg = True
-        emit_log("Forcing build of FFMPEG")
-    if parsed.force_mygui:
-        force_mygui = True
-        emit_log("Forcing build of MyGUI")
-    if parsed.force_qt5:
-        force_qt5 = True
-        emit_log("Forcing build of Qt")
-    if parsed.force_sdl2:
-        force_sdl2 = True
-        emit_log("Forcing build of SDL2")
-    if parsed.force_openmw:
-        force_openmw = True
-        emit_log("Forcing build of OpenMW")
-    if parsed.force_osg:
-        force_osg = True
-        emit_log("Forcing build of OSG")
-    if parsed.force_unshield:
-        force_unshield = True
-        emit_log("Forcing build of Unshield")
+        for flag in FORCE_ALL_FLAGS:
+            setattr(parsed, flag, True)
     if parsed.install_prefix:
         install_prefix = parsed.install_prefix
-        emit_log("Using the install prefix: " + install_prefix)
+        emit_log("Using the install prefix: %s", install_prefix)
     if parsed.jobs:
         cpus = parsed.jobs
-        emit_log("'-j{}' will be used with make".format(cpus))
-    if parsed.no_pull:
-        pull = False
-        emit_log("git fetch will not be ran")
+        emit_log("'-j%s' will be used with make", cpus)
     if parsed.out:
         out_dir = parsed.out
-        emit_log("Out dir set to: " + out_dir)
+        emit_log("Out dir set to: %s", out_dir)
     if parsed.patch:
         patch = os.path.abspath(parsed.patch)
         if os.path.isfile(patch):
-            emit_log("Will attempt to use this patch: " + patch)
+            emit_log("Will attempt to use this patch: %s", patch)
         else:
             error_and_die("The supplied patch isn't a file!")
-    if parsed.skip_install_pkgs:
-        skip_install_pkgs = parsed.skip_install_pkgs
-        emit_log("Package installs will be skipped")
-    if parsed.system_osg:
-        system_osg = True
-        emit_log("The system OSG will be used.")
-        emit_log("The system OSG will be used.")
     if parsed.src_dir:
         src_dir = parsed.src_dir
-        emit_log("Source directory set to: " + src_dir)
-    if parsed.verbose:
-        verbose = parsed.verbose
-        logging.getLogger().setLevel(logging.DEBUG)
-        emit_log("Verbose output enabled")
-    if parsed.with_debug:
-        with_debug = True
-    if parsed.with_essimporter:
-        with_essimporter = True
-    if parsed.without_cs:
-        without_cs = True
-    if parsed.without_iniimporter:
-        without_iniimporter = True
-    if parsed.without_launcher:
-        without_launcher = True
-    if parsed.without_wizard:
-        without_wizard = True
+        emit_log("Source directory set to: %s", src_dir)
+    if parsed.without_ccache:
+        compiler_launcher = None
+        emit_log("ccache will not be used")
+    elif compiler_launcher:
+        emit_log("Compiling through %s", compiler_launcher)
+    if parsed.distcc or parsed.icecream:
+        distcc = shutil.which("distcc" if parsed.distcc else "icecc")
+        if not distcc:
+            error_and_die("Distributed compilation was asked for but isn't installed!")
+        emit_log("Distributing compilation with %s", distcc)
+        # ccache can hand off to distcc itself, anything else gets replaced.
+        if not compiler_launcher or os.path.basename(compiler_launcher) != "ccache":
+            compiler_launcher = distcc
+        if not parsed.jobs:
+            # Remote hosts add to the local cores, so keep more jobs in flight.
+            cpus = CPUS * 3
+            emit_log("'-j%s' will be used with make", cpus)
 
     if parsed.sdl_version:
         sdl_version = parsed.sdl_version
-        emit_log("Building SDL version: " + patch)
+        emit_log("Building SDL version: %s", sdl_version)
 
     if parsed.branch:
         branch = rev = parsed.branch
         if "/" not in branch:
             branch = rev = "origin/" + parsed.branch
-        emit_log("Branch selected: " + branch)
+        emit_log("Branch selected: %s", branch)
     elif parsed.sha:
         sha = rev = parsed.sha
-        emit_log("SHA selected: " + sha)
+        emit_log("SHA selected: %s", sha)
     elif parsed.tag:
         tag = rev = parsed.tag
-        emit_log("Tag selected: " + tag)
+        emit_log("Tag selected: %s", tag)
     else:
         rev = "origin/" + branch
 
     try:
-        out, err = get_distro()
-        if err:
-            error_and_die(err.decode())
+        distro = get_distro()
     except FileNotFoundError:
-        if skip_install_pkgs:
+        if parsed.skip_install_pkgs:
             pass
         else:
             error_and_die(
                 "Unable to determine your distro to install dependencies!  Try again and use '-S' if you know what you are doing."
             )
-    else:
-        distro = out.decode().split(":")[1].strip()
 
-    if not skip_install_pkgs:
-        out, err = install_packages(distro, verbose=verbose)
-        if err:
-            # Isn't always necessarily exit-worthy
-            emit_log("Stderr received: " + err.decode())
+    if not parsed.src_dir:
+        src_dir = os.path.join(install_prefix, "src")
+    osg_root = os.path.join(install_prefix, "osg-openmw")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        # Fetching OpenMW only waits on the network, so get it going while
+        # the packages install.
+        openmw_fetch = executor.submit(
+            get_repo_sha, src_dir, rev=rev, pull=pull, verbose=parsed.verbose
+        )
+        if not parsed.skip_install_pkgs:
+            out, err = install_packages(distro, verbose=parsed.verbose)
+            if err:
+                # Isn't always necessarily exit-worthy
+                emit_log("Stderr received: %s", err.decode())
+    openmw_sha = openmw_fetch.result()
 
-    src_dir = os.path.join(install_prefix, "src")
-    # This is a serious edge case, but let's
-    # show a sane error when /opt doesn't exist.
-    ensure_dir(os.path.join("/", "opt"))
     ensure_dir(install_prefix)
     ensure_dir(src_dir)
 
-    if build_ffmpeg or force_ffmpeg:
+    deps = []
+    if parsed.build_ffmpeg or parsed.force_ffmpeg:
         # FFMPEG
-        build_library(
-            "ffmpeg",
-            check_file=os.path.join(install_prefix, "ffmpeg", "bin", "ffmpeg"),
-            cmake=False,
-            cpus=cpus,
-            force=force_ffmpeg,
-            git_url="https://github.com/FFmpeg/FFmpeg.git",
-            install_prefix=install_prefix,
-            src_dir=src_dir,
-            verbose=verbose,
-            version=FFMPEG_VERSION,
+        deps.append(
+            dict(
+                libname="ffmpeg",
+                check_file=os.path.join(install_prefix, "ffmpeg", "bin", "ffmpeg"),
+                cmake=False,
+                compiler_launcher=compiler_launcher,
+                cpus=cpus,
+                distcc=distcc,
+                force=parsed.force_ffmpeg,
+                git_url="https://github.com/FFmpeg/FFmpeg.git",
+                install_prefix=install_prefix,
+                src_dir=src_dir,
+                verbose=parsed.verbose,
+                version=FFMPEG_VERSION,
+            )
         )
 
-    if not system_osg:
+    if not parsed.system_osg:
         # OSG-OPENMW
 
-        build_library(
-            "osg-openmw",
-            check_file=os.path.join(install_prefix, "osg-openmw", "lib", "libosg.so"),
-            cmake_args=[
-                "-DBUILD_OSG_PLUGINS_BY_DEFAULT=0",
-                "-DBUILD_OSG_PLUGIN_OSG=1",
-                "-DBUILD_OSG_PLUGIN_DDS=1",
-                "-DBUILD_OSG_PLUGIN_TGA=1",
-                "-DBUILD_OSG_PLUGIN_BMP=1",
-                "-DBUILD_OSG_PLUGIN_JPEG=1",
-                "-DBUILD_OSG_PLUGIN_PNG=1",
-                "-DBUILD_OSG_DEPRECATED_SERIALIZERS=0",
-                "-DBUILD_OSG_EXAMPLES=0",
-            ],
-            cpus=cpus,
-            force=force_osg,
-            git_url="https://github.com/OpenMW/osg.git",
-            install_prefix=install_prefix,
-            src_dir=src_dir,
-            verbose=verbose,
+        deps.append(
+            dict(
+                libname="osg-openmw",
+                check_file=os.path.join(osg_root, "lib", "libosg.so"),
+                cmake_args=OSG_CMAKE_ARGS,
+                compiler_launcher=compiler_launcher,
+                cpus=cpus,
+                distcc=distcc,
+                force=parsed.force_osg,
+                git_url="https://github.com/OpenMW/osg.git",
+                install_prefix=install_prefix,
+                src_dir=src_dir,
+                verbose=parsed.verbose,
+            )
         )
 
     # BULLET
-    if not system_bullet or force_bullet:
-        build_library(
-            "bullet",
-            check_file=os.path.join(
-                install_prefix, "bullet", "lib", "libLinearMath.so"
-            ),
-            cmake_args=[
-                "-DINSTALL_LIBS=on",
-                "-DBUILD_BULLET3=off",
-                "-DBUILD_CPU_DEMOS=off",
-                "-DBUILD_UNIT_TESTS=off",
-                "-DBUILD_BULLET2_DEMOS=off",
-                "-DBUILD_EXTRAS=off",
-                "-DBUILD_GIMPACTUTILS_EXTRA=off",
-                "-DBUILD_HACD_EXTRA=off",
-                "-DBUILD_INVERSE_DYNAMIC_EXTRA=off",
-                "-DBUILD_OBJ2SDF_EXTRA=off",
-                "-DBUILD_OPENGL3_DEMOS=off",
-                "-DBUILD_BULLET_ROBOTICS_EXTRA=off",
-                "-DBUILD_BULLET_ROBOTICS_GUI_EXTRA=off",
-                "-DBUILD_SHARED_LIBS=on",
-                "-DBULLET2_MULTITHREADING=on",
-                "-DUSE_DOUBLE_PRECISION=on",
-                "-DCMAKE_BUILD_TYPE=Release",
-            ],
-            cpus=cpus,
-            force=force_bullet,
-            git_url="https://github.com/bulletphysics/bullet3.git",
-            install_prefix=install_prefix,
-            src_dir=src_dir,
-            verbose=verbose,
-            version=BULLET_VERSION,
+    if not parsed.system_bullet or parsed.force_bullet:
+        deps.append(
+            dict(
+                libname="bullet",
+                check_file=os.path.join(
+                    install_prefix, "bullet", "lib", "libLinearMath.so"
+                ),
+                cmake_args=BULLET_CMAKE_ARGS,
+                compiler_launcher=compiler_launcher,
+                cpus=cpus,
+                distcc=distcc,
+                force=parsed.force_bullet,
+                git_url="https://github.com/bulletphysics/bullet3.git",
+                install_prefix=install_prefix,
+                src_dir=src_dir,
+                verbose=parsed.verbose,
+                version=BULLET_VERSION,
+            )
         )
 
     # UNSHIELD
-    if build_unshield or force_unshield:
-        build_library(
-            "unshield",
-            check_file=os.path.join(install_prefix, "unshield", "bin", "unshield"),
-            cpus=cpus,
-            force=force_unshield,
-            git_url="https://github.com/twogood/unshield.git",
-            install_prefix=install_prefix,
-            src_dir=src_dir,
-            verbose=verbose,
-            version=UNSHIELD_VERSION,
+    if parsed.build_unshield or parsed.force_unshield:
+        deps.append(
+            dict(
+                libname="unshield",
+                check_file=os.path.join(install_prefix, "unshield", "bin", "unshield"),
+                compiler_launcher=compiler_launcher,
+                cpus=cpus,
+                distcc=distcc,
+                force=parsed.force_unshield,
+                git_url="https://github.com/twogood/unshield.git",
+                install_prefix=install_prefix,
+                src_dir=src_dir,
+                verbose=parsed.verbose,
+                version=UNSHIELD_VERSION,
+            )
         )
 
     # MYGUI
-    if build_mygui or force_mygui:
-        build_library(
-            "mygui",
-            check_file=os.path.join(
-                install_prefix,
-                "mygui",
-                "include",
-                "MYGUI",
-                "MyGUI.h",
-            ),
-            cmake_args=[
-                "-DMYGUI_BUILD_TOOLS=OFF",
-                "-DMYGUI_RENDERSYSTEM=1",
-                "-DMYGUI_BUILD_DEMOS=OFF",
-                "-DMYGUI_BUILD_PLUGINS=OFF",
-                "-DMYGUI_BUILD_TEST_APP=OFF",
-                "-DMYGUI_BUILD_TOOLS=OFF",
-                "-DMYGUI_BUILD_UNITTESTS=OFF",
-            ],
-            cpus=cpus,
-            force=force_mygui,
-            git_url="https://github.com/MyGUI/mygui.git",
-            install_prefix=install_prefix,
-            src_dir=src_dir,
-            verbose=verbose,
-            version=MYGUI_VERSION,
+    if parsed.build_mygui or parsed.force_mygui:
+        deps.append(
+            dict(
+                libname="mygui",
+                check_file=os.path.join(
+                    install_prefix,
+                    "mygui",
+                    "include",
+                    "MYGUI",
+                    "MyGUI.h",
+                ),
+                cmake_args=MYGUI_CMAKE_ARGS,
+                compiler_launcher=compiler_launcher,
+                cpus=cpus,
+                distcc=distcc,
+                force=parsed.force_mygui,
+                git_url="https://github.com/MyGUI/mygui.git",
+                install_prefix=install_prefix,
+                src_dir=src_dir,
+                verbose=parsed.verbose,
+                version=MYGUI_VERSION,
+            )
         )
 
     # Qt5 (base)
-    if build_qt5:
-        build_library(
-            "qt5",
-            check_file=os.path.join(install_prefix, "qt5", "bin", "qmake"),
-            cmake=False,
-            cpus=cpus,
-            force=force_qt5,
-            git_url="https://github.com/qt/qtbase.git",
-            install_prefix=install_prefix,
-            src_dir=src_dir,
-            verbose=verbose,
-            version=QT_VERSION,
+    if parsed.build_qt5:
+        deps.append(
+            dict(
+                libname="qt5",
+                check_file=os.path.join(install_prefix, "qt5", "bin", "qmake"),
+                cmake=False,
+                compiler_launcher=compiler_launcher,
+                cpus=cpus,
+                distcc=distcc,
+                force=parsed.force_qt5,
+                git_url="https://github.com/qt/qtbase.git",
+                install_prefix=install_prefix,
+                src_dir=src_dir,
+                verbose=parsed.verbose,
+                version=QT_VERSION,
+            )
         )
 
     # SDL2
-    if build_sdl2:
-        build_library(
-            "sdl2",
-            check_file=os.path.join(install_prefix, "sdl2", "bin", "sdl2-config"),
-            cmake=False,
-            cpus=cpus,
-            force=force_sdl2,
-            git_url="https://github.com/libsdl-org/SDL.git",
-            install_prefix=install_prefix,
-            src_dir=src_dir,
-            verbose=verbose,
-            version=sdl_version,
+    if parsed.build_sdl2:
+        deps.append(
+            dict(
+                libname="sdl2",
+                check_file=os.path.join(install_prefix, "sdl2", "bin", "sdl2-config"),
+                cmake=False,
+                compiler_launcher=compiler_launcher,
+                cpus=cpus,
+                distcc=distcc,
+                force=parsed.force_sdl2,
+                git_url="https://github.com/libsdl-org/SDL.git",
+                install_prefix=install_prefix,
+                src_dir=src_dir,
+                verbose=parsed.verbose,
+                version=sdl_version,
+            )
         )
 
+    # Clone every missing source up front and all at once, the clones are
+    # network-bound and don't depend on each other.
+    clones = [
+        (dep["libname"], dep["libname"], dep["git_url"], dep.get("version", "master"))
+        for dep in deps
+        if needs_build(dep)
+    ]
+    clones.append(("openmw", "openmw", OPENMW_GIT_URL, rev))
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(8, len(clones))
+    ) as executor:
+        futures = [
+            executor.submit(clone_if_missing, *clone, src_dir=src_dir)
+            for clone in clones
+        ]
+        for future in futures:
+            future.result()
+
+    # These don't depend on each other, so they can be built side by side.
+    concurrent_deps = [
+        dep for dep in deps if dep["libname"] in CONCURRENT_LIBS and needs_build(dep)
+    ]
+    for dep in deps:
+        if dep not in concurrent_deps:
+            build_library(**dep)
+    build_many(concurrent_deps)
+
     # OPENMW
-    openmw_sha = get_repo_sha(src_dir, rev=rev, pull=pull, verbose=verbose)
-    if openmw_sha:
-        openmw = "openmw-{}".format(openmw_sha)
-    else:
-        # There's no sha yet since the source hasn't been cloned.
-        openmw = "openmw"
+    if not openmw_sha:
+        # It was only just cloned, so there's nothing new to fetch.
+        openmw_sha = get_repo_sha(src_dir, rev=rev, pull=False, verbose=parsed.verbose)
+    openmw = "openmw-{}".format(openmw_sha)
+    # Build exactly the commit the install dir is named after, rev may be a
+    # branch that has moved on while the dependencies were building.
+    openmw_rev = (
+        execute_shell(
+            ["git", "-C", os.path.join(src_dir, "openmw"), "rev-parse", openmw_sha]
+        )[1][0]
+        .decode()
+        .strip()
+    )
 
     build_env = {"PATH": os.environ["PATH"]}
 
-    if system_osg:
-        prefix_path = ""
-    else:
-        prefix_path = "{0}/osg-openmw"
-
-    if not system_bullet or force_bullet:
-        prefix_path += ":{0}/bullet"
-    if not build_ffmpeg or force_ffmpeg:
-        prefix_path += ":{0}/ffmpeg"
-        prefix_path += ":{0}/mygui"
-    if build_qt5 or force_qt5:
-        prefix_path += ":{0}/qt5"
-    if build_sdl2 or force_sdl2:
-        prefix_path += ":{0}/sdl2"
-    if build_unshield or force_unshield:
-        prefix_path += ":{0}/unshield"
-
-    build_env["CMAKE_PREFIX_PATH"] = prefix_path.format(install_prefix)
-
-    distro = None
-    try:
-        out, err = get_distro()
-        if err:
-            error_and_die(err.decode())
-        distro = out.decode().split(":")[1].strip()
-    except FileNotFoundError:
-        if skip_install_pkgs:
-            pass
-        else:
-            error_and_die(
-                "Unable to determine your distro to install dependencies!  Try again and use '-S' if you know what you are doing."
-            )
+    # Point CMake at the dependencies this script builds itself.
+    prefix_libs = []
+    if not parsed.system_osg:
+        prefix_libs.append("osg-openmw")
+    if not parsed.system_bullet or parsed.force_bullet:
+        prefix_libs.append("bullet")
+    if parsed.build_ffmpeg or parsed.force_ffmpeg:
+        prefix_libs.append("ffmpeg")
+    if parsed.build_mygui or parsed.force_mygui:
+        prefix_libs.append("mygui")
+    if parsed.build_qt5 or parsed.force_qt5:
+        prefix_libs.append("qt5")
+    if parsed.build_sdl2 or parsed.force_sdl2:
+        prefix_libs.append("sdl2")
+    if parsed.build_unshield or parsed.force_unshield:
+        prefix_libs.append("unshield")
+
+    build_env["CMAKE_PREFIX_PATH"] = ":".join(
+        os.path.join(install_prefix, lib) for lib in prefix_libs
+    )
 
     build_type = "Release"
-    if with_debug:
+    if parsed.with_debug:
         build_type = "Debug"
 
     build_args = ["-DCMAKE_BUILD_TYPE=" + build_type, "-DDESIRED_QT_VERSION=5"]
 
     # Don't build the save importer..
-    if not with_essimporter:
+    if not parsed.with_essimporter:
         build_args.append("-DBUILD_ESSIMPORTER=no")
 
-    if without_cs:
+    if parsed.without_cs:
         emit_log("NOT building the openmw-cs executable ...")
         build_args.append("-DBUILD_OPENCS=no")
 
-    if without_iniimporter:
+    if parsed.without_iniimporter:
         emit_log("NOT building the openmw-iniimporter executable ...")
         build_args.append("-DBUILD_MWINIIMPORTER=no")
 
-    if without_launcher:
+    if parsed.without_launcher:
         emit_log("NOT building the openmw-launcher executable ...")
         build_args.append("-DBUILD_LAUNCHER=no")
 
-    if without_wizard:
+    if parsed.without_wizard:
         emit_log("NOT building the openmw-wizard executable ...")
         build_args.append("-DBUILD_WIZARD=no")
 
-    if with_debug:
+    if parsed.with_debug:
         build_args.append("-DOPENMW_LTO_BUILD=off")
     else:
         build_args.append("-DOPENMW_LTO_BUILD=on")
 
-    if not system_osg:
+    if not parsed.system_osg:
         build_args.append(
-            "-DOSG_DIR=" + os.path.join(install_prefix, "osg-openmw"),
+            "-DOSG_DIR=" + osg_root,
         )
 
     build_library(
@@ -936,31 +1313,31 @@ def main() -> None:
         check_file=os.path.join(install_prefix, openmw, "bin", "openmw"),
         cmake_args=build_args,
         clone_dest="openmw",
+        compiler_launcher=compiler_launcher,
         cpus=cpus,
+        distcc=distcc,
         env=build_env,
-        force=force_openmw,
-        git_url="https://github.com/OpenMW/openmw.git",
+        # Anything new was already fetched before openmw_sha was looked up.
+        fetch=False,
+        force=parsed.force_openmw,
+        git_url=OPENMW_GIT_URL,
         install_prefix=install_prefix,
         patch=patch,
         src_dir=src_dir,
-        verbose=verbose,
-        version=rev,
-    )
-    os.chdir(install_prefix)
-    # Don't fetch updates since new ones might exist
-    openmw_sha = get_repo_sha(src_dir, rev=rev, pull=False, verbose=verbose)
-    os.chdir(install_prefix)
-    if str(openmw_sha) not in openmw:
-        os.rename("openmw", "openmw-{}".format(openmw_sha))
-    if os.path.islink("openmw"):
-        os.remove("openmw")
-    os.symlink("openmw-" + openmw_sha, "openmw")
+        verbose=parsed.verbose,
+        version=openmw_rev,
+    )
+    # Point the link at the new build in one rename(2) so an interrupted
+    # run never leaves install_prefix without an openmw link.
+    tmp_link = os.path.join(install_prefix, ".openmw.link.{}".format(os.getpid()))
+    os.symlink(openmw, tmp_link)
+    os.replace(tmp_link, os.path.join(install_prefix, "openmw"))
 
     end = datetime.datetime.now()
     duration = end - start
     minutes = int(duration.total_seconds() // 60)
     seconds = int(duration.total_seconds() % 60)
-    emit_log("Took {m} minutes, {s} seconds.".format(m=minutes, s=seconds))
+    emit_log("Took %d minutes, %d seconds.", minutes, seconds)
 
 
 if __name__ == "__main__":